@@ -1,10 +1,16 @@
 from __future__ import annotations
-from io import BytesIO, TextIOWrapper
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property, lru_cache
+from io import IOBase, StringIO
 from typing import Callable
 import hashlib
+import os
 import re
+import shlex
+import sys
 
-from paramiko import PasswordRequiredException, RSAKey, SSHClient, AutoAddPolicy
+from paramiko import (
+    PasswordRequiredException, RSAKey, SSHClient, SFTPClient, AutoAddPolicy)
 from paramiko.channel import ChannelStdinFile, ChannelFile, ChannelStderrFile
 
 
@@ -19,6 +25,95 @@ class SSHPasswordRequiredException(Exception):
     pass
 
 
+def _load_rsa_key(pem: str, password: str | None) -> RSAKey:
+    if os.path.isfile(pem):
+        return _parse_rsa_key(pem, password, os.path.getmtime(pem))
+
+    return _parse_rsa_key(pem, password)
+
+
+@lru_cache(maxsize=32)
+def _parse_rsa_key(
+    pem: str,
+    password: str | None,
+    mtime: float | None = None
+) -> RSAKey:
+    try:
+        if mtime is not None:
+            return RSAKey.from_private_key_file(pem, password)
+
+        return RSAKey.from_private_key(StringIO(pem.strip()), password)
+
+    except PasswordRequiredException:
+        raise SSHPasswordRequiredException(
+            "PEM is encrypted and requires a valid password")
+
+
+def _normalize_cmd(command: str | list[str] | tuple[str, ...]) -> str:
+    return ";".join(command) if isinstance(command, (list, tuple)) else command
+
+
+def _read_into(file, buf: bytearray, chunk_size: int = 1 << 15) -> int:
+    initial_len = len(buf)
+    offset = 0
+
+    while True:
+        if len(buf) - offset < chunk_size:
+            buf.extend(bytes(max(len(buf), chunk_size)))
+
+        n = file.readinto(memoryview(buf)[offset:])
+        if not n:
+            break
+
+        offset += n
+
+    # Drop the growth tail, but never shrink the caller's buffer below
+    # its original size when nothing was read
+    del buf[offset if offset else initial_len:]
+    return offset
+
+
+@lru_cache(maxsize=128)
+def _compile_pattern(pattern: bytes, flags: int = 0) -> re.Pattern[bytes]:
+    return re.compile(pattern, flags)
+
+
+def _new_digest(algo: str):
+    if algo == 'blake3':
+        import blake3
+        return blake3.blake3()
+
+    if algo in ('xxh3_128', 'xxh3'):
+        import xxhash
+        return xxhash.xxh3_128()
+
+    return hashlib.new(algo)
+
+
+def _hash_stream(file, algo: str = 'md5', chunk_size: int = 1 << 20) -> str:
+    digest = _new_digest(algo)
+
+    if isinstance(file, IOBase):
+        # Local files: reuse one buffer via readinto instead of
+        # allocating a fresh bytes object per chunk
+        buf = bytearray(chunk_size)
+        view = memoryview(buf)
+
+        while n := file.readinto(buf):
+            digest.update(view[:n])
+
+        return digest.hexdigest()
+
+    while True:
+        block = file.read(chunk_size)
+        if not block:
+            break
+
+        digest.update(block)
+
+    return digest.hexdigest()
+
+
 class SSHExecuteResult:
 
     def __init__(
@@ -57,42 +152,82 @@ class SSHExecuteResult:
         return self.exit_code
 
 
+    @cached_property
+    def _stdout_bytes(self) -> bytes:
+        if self.stdout is None:
+            return b''
+
+        buf = bytearray()
+        _read_into(self.stdout, buf)
+        return bytes(buf)
+
+
+    @cached_property
+    def _stdout_text(self) -> str:
+        return self._stdout_bytes.decode()
+
+
+    @cached_property
+    def _stderr_bytes(self) -> bytes:
+        if self.stderr is None:
+            return b''
+
+        buf = bytearray()
+        _read_into(self.stderr, buf)
+        return bytes(buf)
+
+
+    @cached_property
+    def _stderr_text(self) -> str:
+        return self._stderr_bytes.decode()
+
+
     def get_stdout(
-        self, 
-        *, 
-        _bytes: bool = False, 
+        self,
+        *,
+        _bytes: bool = False,
         lines: bool = False
     ) -> str | bytes | list[str]:
 
-        if self.stdout is None:
-            return b'' if _bytes else ''
-        
         if _bytes:
-            return self.stdout.read()
+            return self._stdout_bytes
 
         if lines:
-            return self.stdout.readlines()
-        
-        return self.stdout.read().decode()
+            return self._stdout_text.splitlines(keepends=True)
+
+        return self._stdout_text
+
+
+    def get_stdout_into(self, buf: bytearray) -> int:
+        data = self._stdout_bytes
+        if data:
+            buf[:] = data
+
+        return len(data)
 
 
     def get_stderr(
-        self, 
-        *, 
-        _bytes: bool = False, 
+        self,
+        *,
+        _bytes: bool = False,
         lines: bool = False
     ) -> str | bytes | list[str]:
 
-        if self.stderr is None:
-            return b'' if _bytes else ''
-        
         if _bytes:
-            return self.stderr.read()
-        
+            return self._stderr_bytes
+
         if lines:
-            return self.stderr.readlines()
-        
-        return self.stderr.read().decode()
+            return self._stderr_text.splitlines(keepends=True)
+
+        return self._stderr_text
+
+
+    def get_stderr_into(self, buf: bytearray) -> int:
+        data = self._stderr_bytes
+        if data:
+            buf[:] = data
+
+        return len(data)
 
 
     def flush(self, data: str | bytes) -> None:
@@ -117,6 +252,7 @@ class SSH:
         pem: str | None = None
     ) -> None:
         self.client: SSHClient
+        self._sftp: SFTPClient | None = None
         self._connect_client(host, username, password, pem)
         SSH.last = self
 
@@ -144,28 +280,7 @@ class SSH:
         pem: str,
         password: str | None
     ):
-        _pem = None
-
-        try:
-            _pem = RSAKey.from_private_key_file(pem, password)
-
-        except PasswordRequiredException as e:
-            raise SSHPasswordRequiredException(
-                "PEM file is encrypted and requires a valid password")
-
-        except Exception:
-            try:
-                _pem = RSAKey.from_private_key(
-                    TextIOWrapper(BytesIO(pem.strip().encode())), 
-                    password
-                )
-
-            except PasswordRequiredException as e:
-                raise SSHPasswordRequiredException(
-                    "PEM is encrypted and requires a valid password")
-
-            except Exception as e:
-                raise e
+        _pem = _load_rsa_key(pem, password)
 
         try:
             client = SSHClient()
@@ -211,20 +326,16 @@ class SSH:
 
     def exec(
         self,
-        command: str | list[str],
+        command: str | list[str] | tuple[str, ...],
         bufsize: int = -1,
         timeout: float | None = None,
         get_pty: bool = False,
         environment: dict[str, str] | None = None
     ) -> SSHExecuteResult:
         try:
-            if type(command) is list:
-                _command = ";".join(command)
-            else:
-                _command = str(command)
-                
             _stdin, _stdout, _stderr = self.client.exec_command(
-                _command, bufsize, timeout, get_pty, environment)
+                _normalize_cmd(command), bufsize, timeout,
+                get_pty, environment)
         except:
             return SSHExecuteResult(self, server_fail=True)
 
@@ -232,64 +343,116 @@ class SSH:
 
         return SSHExecuteResult(self, _stdin, _stdout, _stderr, exit_code)
 
-    
+
+    def exec_many(self, commands: list[str]) -> SSHExecuteResult:
+        return self.exec(";".join(commands))
+
+
     def async_exec(
         self,
-        command: str | list[str],
+        command: str | list[str] | tuple[str, ...],
         callback: Callable[[bytes], None]
     ) -> None:
-        if type(command) is list:
-            _command = ";".join(command)
-        else:
-            _command = str(command)
-                
         _stdin, _stdout, _stderr = self.client.exec_command(
-            _command, get_pty=True)
+            _normalize_cmd(command), get_pty=True)
+
+        channel = _stdout.channel
 
         while True:
-            v = _stdout.channel.recv(1024)
+            # Drain stderr so a chatty remote side never stalls on a
+            # full stderr window
+            while channel.recv_stderr_ready():
+                channel.recv_stderr(1 << 15)
+
+            v = channel.recv(1 << 15)
             if not v:
                 break
 
             callback(v)
-        
-        if _stdout.channel.recv_exit_status() != 0:
+
+        if channel.recv_exit_status() != 0:
             raise Exception("Execution resulted in failure")
 
 
+    @property
+    def sftp(self) -> SFTPClient:
+        if self._sftp is None:
+            self._sftp = self.client.open_sftp()
+
+        return self._sftp
+
+
     def close(self):
+        if self._sftp is not None:
+            self._sftp.close()
+            self._sftp = None
+
         self.client.close()
 
 
-    def download_file(self, filename: str) -> bytes:
-        with self.client.open_sftp() as ftp:
-            with ftp.open(filename, "rb") as file:
-                return file.read()
+    def download_file(
+        self,
+        filename: str,
+        bufsize: int = 1 << 15,
+        prefetch: bool = True
+    ) -> bytes:
+        ftp = self.sftp
+
+        with ftp.open(filename, "rb", bufsize) as file:
+            if prefetch:
+                file.prefetch(ftp.stat(filename).st_size)
+
+            return file.read()
 
 
     def send_file(self, filename: str, content: bytes | str):
-        with self.client.open_sftp() as ftp:
-            with ftp.open(filename, "wb") as file:
-                try:
-                    with open(content, "rb") as local_file:
-                        file.write(local_file.read())
-                except:
-                    file.write(content)
-
-
-    def validate_files_hash(self, remote_filename: str, local_filename: str):
-        with self.client.open_sftp() as ftp:
-            
-            with ftp.open(remote_filename, "rb") as remote_file:
-                remote_md5 = hashlib.md5(remote_file.read()).hexdigest()
-            
-            with open(local_filename, "rb") as local_file:
-                local_md5 = hashlib.md5(local_file.read()).hexdigest()
-
-            if remote_md5 != local_md5:
-                raise ValueError(
-                    f"Remote file hash <{remote_md5}> is diff "
-                    f"of local file hash <{local_md5}>")
+        with self.sftp.open(filename, "wb") as file:
+            file.set_pipelined(True)
+            try:
+                with open(content, "rb") as local_file:
+                    while True:
+                        chunk = local_file.read(1 << 20)
+                        if not chunk:
+                            break
+
+                        file.write(chunk)
+            except:
+                view = memoryview(
+                    content if isinstance(content, bytes)
+                    else content.encode())
+
+                for offset in range(0, len(view), 1 << 20):
+                    file.write(view[offset:offset + (1 << 20)])
+
+
+    def validate_files_hash(
+        self,
+        remote_filename: str,
+        local_filename: str,
+        algo: str = 'md5'
+    ):
+        remote_size = self.sftp.stat(remote_filename).st_size
+        local_size = os.path.getsize(local_filename)
+
+        if remote_size != local_size:
+            raise ValueError(
+                f"Remote file size <{remote_size}> is diff "
+                f"of local file size <{local_size}>")
+
+        with self.sftp.open(remote_filename, "rb") as remote_file:
+            remote_hash = _hash_stream(remote_file, algo)
+
+        with open(local_filename, "rb") as local_file:
+            if sys.version_info >= (3, 11):
+                local_hash = hashlib.file_digest(
+                    local_file, lambda: _new_digest(algo)).hexdigest()
+            else:
+                local_hash = _hash_stream(local_file, algo)
+
+        if remote_hash != local_hash:
+            raise ValueError(
+                f"Remote file hash <{remote_hash}> is diff "
+                f"of local file hash <{local_hash}>")
 
 
     def edit_file(self, filename: str, callback: Callable[[bytes], bytes]):
@@ -305,11 +468,25 @@ class SSH:
         replacer: str, 
         count: int = 0, 
         flags: int = 0
+    ):
+        return self.edit_file_regex_replace_compiled(
+            filename,
+            _compile_pattern(pattern.encode(), flags),
+            replacer.encode(),
+            count
+        )
+
+
+    def edit_file_regex_replace_compiled(
+        self,
+        filename: str,
+        compiled_pattern: re.Pattern[bytes],
+        replacer: bytes,
+        count: int = 0
     ):
         return self.edit_file(
-            filename, 
-            lambda file: re.sub(pattern, replacer,
-                file.decode(), count=count, flags=flags).encode()
+            filename,
+            lambda file: compiled_pattern.sub(replacer, file, count=count)
         )
 
     
@@ -321,11 +498,25 @@ class SSH:
         count: int = -1
     ):
         return self.edit_file(
-            filename, 
-            lambda file: file.decode().replace(old, new, count=count)
+            filename,
+            lambda file: file.replace(old.encode(), new.encode(), count)
         )
 
 
+    def edit_file_replace_remote(
+        self,
+        filename: str,
+        old: str,
+        new: str
+    ) -> SSHExecuteResult:
+        pattern = re.sub(r'[\\^$.\[\]*/]', lambda m: '\\' + m.group(0), old)
+        replacer = re.sub(r'[\\&/]', lambda m: '\\' + m.group(0), new)
+
+        return self.exec(
+            f"sed -i {shlex.quote(f's/{pattern}/{replacer}/g')} "
+            f"{shlex.quote(filename)}")
+
+
     @staticmethod
     def is_valid_connection(
         host: str, 
@@ -338,3 +529,34 @@ class SSH:
             return True
         except Exception as e:
             return False
+
+
+    @staticmethod
+    def validate_connections(
+        connections: list[tuple[str, str, str | None, str | None]],
+        max_workers: int = 32
+    ) -> list[bool]:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(
+                lambda connection: SSH.is_valid_connection(*connection),
+                connections))
+
+
+    @staticmethod
+    def exec_many_hosts(
+        connections: list[tuple[str, str, str | None, str | None]],
+        command: str | list[str] | tuple[str, ...],
+        max_workers: int = 32
+    ) -> list[SSHExecuteResult]:
+
+        def run(connection) -> SSHExecuteResult:
+            with SSH(*connection) as ssh:
+                result = ssh.exec(command)
+
+                # Cache both streams before close() drops the channel
+                result.get_stdout(_bytes=True)
+                result.get_stderr(_bytes=True)
+                return result
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(run, connections))